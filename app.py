@@ -1,22 +1,22 @@
-import time
-import tempfile
-import google.generativeai as genai
+import uuid
+import hashlib
 from dotenv import load_dotenv
 import os
-import PyPDF2
 import streamlit as st
-import atexit
 import extra_streamlit_components as stx
 
+from pdf_qa import EXCERPT_PROMPT_TMPL, TRIAL_LIMIT, build_chunk_index, \
+    build_fallback_prefix, clear_response_caches, embed_query, ensure_db, \
+    extract_text_from_pdf, get_ai_response, get_batched_ai_response, \
+    get_remaining_trial_requests, increment_trial_usage, retrieve_chunks, \
+    validate_api_key
+
 # Must be the first Streamlit command
 st.set_page_config(page_title="PDF Question & Answer 📚", layout="wide")
 
 # Load environment variables
 load_dotenv()
 
-# Add cookie manager for persistent trial count
-
-
 def get_cookie_manager():
     if 'cookie_manager' not in st.session_state:
         st.session_state.cookie_manager = stx.CookieManager(
@@ -24,11 +24,13 @@ def get_cookie_manager():
     return st.session_state.cookie_manager
 
 
-# Initialize session state with persistent trial count
-if 'trial_count' not in st.session_state:
+if 'client_id' not in st.session_state:
     cookie_manager = get_cookie_manager()
-    saved_count = cookie_manager.get('trial_count')
-    st.session_state.trial_count = int(saved_count) if saved_count else 0
+    client_id = cookie_manager.get('client_id')
+    if not client_id:
+        client_id = str(uuid.uuid4())
+        cookie_manager.set('client_id', client_id)
+    st.session_state.client_id = client_id
 
 if 'user_api_key' not in st.session_state:
     st.session_state.user_api_key = None
@@ -36,59 +38,170 @@ if 'user_api_key' not in st.session_state:
 if 'pdf_text' not in st.session_state:
     st.session_state.pdf_text = None
 
-if 'pdf_name' not in st.session_state:
-    st.session_state.pdf_name = None
+if 'pdf_chunks' not in st.session_state:
+    st.session_state.pdf_chunks = None
+
+if 'pdf_embeddings' not in st.session_state:
+    st.session_state.pdf_embeddings = None
+
+if 'pdf_hash' not in st.session_state:
+    st.session_state.pdf_hash = None
+
+if 'prompt_prefix' not in st.session_state:
+    st.session_state.prompt_prefix = None
 
 # Add after load_dotenv()
 default_api_key = os.getenv('GOOGLE_API_KEY')
 if not default_api_key:
     st.error("⚠️ No default API key found. Please add your API key in the sidebar.")
 
+# Header with emojis — interned at import instead of rebuilt per rerun
+HEADER_HTML = """
+    <h1 style='text-align: center; margin-bottom: 2rem;'>
+        📚 PDF AI Assistant 🤖
+    </h1>
+    <p style='text-align: center; font-size: 1.2em; margin-bottom: 3rem;'>
+        Upload your PDF and let AI answer your questions! ✨
+    </p>
+"""
+
+
+@st.cache_data
+def get_header_html():
+    """Static page header, served from cache on every rerun"""
+    return HEADER_HTML
+
+
+def _apply_api_key():
+    """Validate the sidebar key when it changes, not on every rerun"""
+    key = st.session_state.api_key_input.strip()
+    if not key:
+        st.session_state.user_api_key = None
+        st.session_state.api_key_status = None
+    elif validate_api_key(key):
+        st.session_state.user_api_key = key
+        st.session_state.api_key_status = 'valid'
+    else:
+        st.session_state.user_api_key = None
+        st.session_state.api_key_status = 'invalid'
+
+
+@st.fragment
+def qa_panel():
+    """Question box and answers, rerun in isolation
+
+    As a fragment, typing or submitting a question re-executes only this
+    block — the sidebar, header and upload handling don't re-render per
+    question.
+    """
+    # Question input — several questions (one per line) share one
+    # Gemini call instead of paying the context cost per question
+    question_text = st.text_area(
+        "🤔 Ask about your PDF (one question per line):",
+        placeholder="Example: What is the main topic of this document?"
+    )
+    questions = [q.strip() for q in question_text.splitlines()
+                 if q.strip()]
+
+    # One atomic UPSERT claims the trial and returns the new
+    # count, instead of a SELECT gate plus a later increment
+    if questions and not st.session_state.user_api_key \
+            and increment_trial_usage(
+                st.session_state.client_id) > TRIAL_LIMIT:
+        st.error("❌ Free trial used up. Add your own API key in "
+                 "the sidebar to keep asking questions.")
+        questions = []
+
+    if len(questions) > 1 and st.session_state.pdf_embeddings is not None:
+        try:
+            with st.spinner("🧠 Thinking..."):
+                question_embeddings = [embed_query(q)
+                                       for q in questions]
+                context_chunks = []
+                for embedding in question_embeddings:
+                    for chunk in retrieve_chunks(
+                            embedding,
+                            st.session_state.pdf_chunks,
+                            st.session_state.pdf_embeddings,
+                            top_k=4):
+                        if chunk not in context_chunks:
+                            context_chunks.append(chunk)
+
+                answers = get_batched_ai_response(
+                    questions,
+                    "\n\n".join(context_chunks),
+                    question_embeddings=question_embeddings,
+                    pdf_hash=st.session_state.pdf_hash)
+
+                st.markdown("### 💡 Answers")
+                for q, answer in zip(questions, answers):
+                    st.markdown(f"**{q}**")
+                    st.markdown(f">{answer}")
 
-def validate_api_key(api_key):
-    """Validate API key"""
-    if not api_key or len(api_key.strip()) < 10:
-        return False
-    return True
-
-
-def get_ai_response(prompt):
-    """Get response from Gemini AI"""
-    # Check trial limit and API key availability
-    if not default_api_key:
-        raise Exception("❌ Please add your API key to continue.")
-
-    try:
-        # Configure API
-        api_key =  os.getenv('GOOGLE_API_KEY')
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-pro')
-        response = model.generate_content(prompt)
-
-        return response.text
-    except Exception as e:
-        raise Exception(f"❌ Error: {str(e)}")
+        except Exception as e:
+            st.error(str(e))
 
+    elif questions:
+        question = questions[0]
+        try:
+            with st.spinner("🧠 Thinking..."):
+                question_embedding = None
+                if st.session_state.pdf_embeddings is not None:
+                    question_embedding = embed_query(question)
+                    context = "\n\n".join(retrieve_chunks(
+                        question_embedding,
+                        st.session_state.pdf_chunks,
+                        st.session_state.pdf_embeddings))
+
+                    prompt = EXCERPT_PROMPT_TMPL.format(
+                        context=context, question=question)
+                else:
+                    prompt = (st.session_state.prompt_prefix
+                              + question + "\n\nAnswer:")
+
+                answer = get_ai_response(
+                    prompt,
+                    question_embedding=question_embedding,
+                    pdf_hash=st.session_state.pdf_hash)
+
+                st.markdown("### 💡 Answer")
+                if isinstance(answer, str):
+                    st.markdown(f">{answer}")
+                else:
+                    st.write_stream(answer)
 
-def extract_text_from_pdf(pdf_file):
-    """Extract text from PDF"""
-    pdf_reader = PyPDF2.PdfReader(pdf_file)
-    text = ""
-    for page in pdf_reader.pages:
-        text += page.extract_text() + "\n"
-    return text
+        except Exception as e:
+            st.error(str(e))
 
 
 def main():
-    # Header with emojis
-    st.markdown("""
-        <h1 style='text-align: center; margin-bottom: 2rem;'>
-            📚 PDF AI Assistant 🤖
-        </h1>
-        <p style='text-align: center; font-size: 1.2em; margin-bottom: 3rem;'>
-            Upload your PDF and let AI answer your questions! ✨
-        </p>
-    """, unsafe_allow_html=True)
+    # Trial usage lives server-side in SQLite; cached so the schema
+    # check runs once per process, not once per rerun
+    ensure_db()
+
+    st.markdown(get_header_html(), unsafe_allow_html=True)
+
+    with st.sidebar:
+        st.text_input(
+            "🔑 Your Gemini API key (optional)",
+            type="password",
+            help="Leave empty to use the app's default key",
+            key="api_key_input",
+            on_change=_apply_api_key)
+        if st.session_state.get('api_key_status') == 'valid':
+            st.success("✅ Using your API key")
+        elif st.session_state.get('api_key_status') == 'invalid':
+            st.error("❌ That key doesn't look valid")
+
+        if not st.session_state.user_api_key:
+            remaining = get_remaining_trial_requests(
+                st.session_state.client_id)
+            st.caption(f"🎟️ {remaining} of {TRIAL_LIMIT} "
+                       "free questions left")
+
+        if st.button("🧹 Clear answer cache",
+                     help="Forget cached answers"):
+            clear_response_caches()
 
     # Main content
     col1, col2, col3 = st.columns([1, 2, 1])
@@ -101,37 +214,32 @@ def main():
 
     if uploaded_file:
         try:
-            if st.session_state.pdf_name != uploaded_file.name:
+            # Key on content, not filename: a renamed re-upload shouldn't
+            # re-parse, and two different files sharing a name shouldn't
+            # serve each other's text
+            pdf_bytes = uploaded_file.getvalue()
+            pdf_hash = hashlib.blake2b(pdf_bytes, digest_size=16).hexdigest()
+            if st.session_state.pdf_hash != pdf_hash:
                 with st.spinner("🔍 Reading PDF..."):
-                    pdf_text = extract_text_from_pdf(uploaded_file)
+                    pdf_text = extract_text_from_pdf(pdf_bytes)
                     st.session_state.pdf_text = pdf_text
-                    st.session_state.pdf_name = uploaded_file.name
+                    st.session_state.pdf_hash = pdf_hash
+                with st.spinner("🧩 Indexing PDF for fast answers..."):
+                    try:
+                        chunks, embeddings = build_chunk_index(pdf_text)
+                    except Exception:
+                        # Retrieval is an optimization; fall back to raw text
+                        chunks, embeddings = None, None
+                    st.session_state.pdf_chunks = chunks
+                    st.session_state.pdf_embeddings = embeddings
+                    # Without retrieval, precompute the truncated-document
+                    # prompt prefix once instead of per question
+                    st.session_state.prompt_prefix = (
+                        build_fallback_prefix(pdf_text)
+                        if embeddings is None else None)
                 st.success("✅ PDF processed successfully!")
 
-            # Question input
-            question = st.text_input(
-                "🤔 Ask a question about your PDF:",
-                placeholder="Example: What is the main topic of this document?"
-            )
-
-            if question:
-                try:
-                    with st.spinner("🧠 Thinking..."):
-                        prompt = f"""Based on this PDF text, please answer the question.
-                        
-                        Text: {st.session_state.pdf_text[:2000]}
-                        
-                        Question: {question}
-                        
-                        Answer:"""
-
-                        answer = get_ai_response(prompt)
-
-                        st.markdown("### 💡 Answer")
-                        st.markdown(f">{answer}")
-
-                except Exception as e:
-                    st.error(str(e))
+            qa_panel()
 
         except Exception as e:
             st.error(
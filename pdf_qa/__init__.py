@@ -0,0 +1,11 @@
+"""Shared helpers for the PDF AI assistant."""
+
+from pdf_qa.ai import EXCERPT_PROMPT_TMPL, build_fallback_prefix, \
+    clear_response_caches, get_ai_response, get_batched_ai_response, \
+    get_cache_key, get_model, validate_api_key
+from pdf_qa.extraction import extract_text_from_pdf
+from pdf_qa.rate_limit import acquire_request_token
+from pdf_qa.retrieval import build_chunk_index, chunk_text, embed_query, \
+    get_embedding_model, retrieve_chunks
+from pdf_qa.trials import TRIAL_LIMIT, ensure_db, \
+    get_remaining_trial_requests, increment_trial_usage, init_database
@@ -0,0 +1,367 @@
+"""Gemini model access, response caching, and answer streaming."""
+
+import os
+import re
+import random
+import asyncio
+import hashlib
+import functools
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import streamlit as st
+from dotenv import load_dotenv
+
+from pdf_qa.cache import get_cached_response, store_cached_response
+from pdf_qa.rate_limit import acquire_request_token
+
+# Bound on the process-wide exact-match response cache
+RESPONSE_CACHE_MAX_ENTRIES = 256
+
+# Semantic cache: treat questions this similar as the same question
+SEMANTIC_CACHE_THRESHOLD = 0.95
+SEMANTIC_CACHE_MAX_ENTRIES = 512
+
+# Retries for transient (rate-limit) API failures
+MAX_RETRIES = 3
+
+# gemini-pro's window is ~32k tokens; leave headroom for question/answer
+FALLBACK_TOKEN_BUDGET = 28000
+APPROX_CHARS_PER_TOKEN = 4
+
+# Prompt templates, built once at import instead of per question
+EXCERPT_PROMPT_TMPL = """Based on these excerpts from the PDF, please answer the question.
+If the excerpts don't contain the answer, say so.
+
+Excerpts: {context}
+
+Question: {question}
+
+Answer:"""
+
+BATCH_PROMPT_TMPL = """Based on these excerpts from the PDF, answer each question independently.
+If the excerpts don't contain an answer, say so for that question.
+Format each answer on its own line as 'A<n>: <answer>'.
+
+Excerpts: {context}
+
+{questions}"""
+
+
+# Gemini keys are URL-safe tokens; compiled once at import
+_KEY_RE = re.compile(r"^[A-Za-z0-9_\-]{20,}$")
+
+
+def validate_api_key(api_key):
+    """Cheap format check on a candidate API key"""
+    return bool(api_key and _KEY_RE.match(api_key.strip()))
+
+
+# Key the SDK is currently configured with; genai config is
+# process-global, so switching keys means reconfiguring, but in the
+# common single-key case this makes reconfiguration a no-op
+_configured_key = None
+
+
+# Load .env here rather than relying on the entry script's later
+# load_dotenv() call, then bind the default key once — os.getenv walks
+# the environment dict on every call and sits on the question path
+load_dotenv()
+_ENV_API_KEY = os.getenv('GOOGLE_API_KEY')
+
+
+def _resolve_api_key():
+    """User-supplied key first, falling back to the default env key"""
+    return st.session_state.get('user_api_key') or _ENV_API_KEY
+
+
+@functools.cache
+def _genai():
+    """Import google.generativeai on first use
+
+    The SDK drags in grpc and protobuf, which dominate cold-start import
+    time; deferring it lets the page paint before any model is needed.
+    """
+    import google.generativeai as genai
+    return genai
+
+
+def _configure(api_key):
+    global _configured_key
+    if api_key != _configured_key:
+        _genai().configure(api_key=api_key, transport='grpc')
+        _configured_key = api_key
+
+
+# Error classes, compiled once: a single regex scan per failure instead
+# of a chain of substring checks
+_AUTH_ERR_RE = re.compile(
+    r"api.?key|unauthenticated|permission_denied|401|403")
+_RETRYABLE_ERR_RE = re.compile(r"resource_exhausted|rate limit|429")
+
+
+def _drop_configured_key_on_auth_error(error_message):
+    """Forget the configured key if the API rejected it
+
+    Otherwise the no-op check in _configure would keep reusing a key the
+    server has already refused, even after the user fixes it in the env.
+    """
+    global _configured_key
+    if _AUTH_ERR_RE.search(error_message):
+        _configured_key = None
+
+
+@st.cache_resource
+def _model_handle():
+    """One GenerativeModel object per process, shared across sessions"""
+    return _genai().GenerativeModel('gemini-pro')
+
+
+def get_model(api_key=None):
+    """Return the shared Gemini model, configured for the right API key
+
+    Pinning the gRPC transport means every generate call reuses one
+    multiplexed HTTP/2 channel instead of paying a TCP+TLS handshake per
+    question.
+    """
+    _configure(api_key or _resolve_api_key())
+    return _model_handle()
+
+
+def truncate_to_token_budget(text, budget=FALLBACK_TOKEN_BUDGET):
+    """Trim text to the model context budget, counting tokens only once"""
+    max_chars = budget * APPROX_CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    truncated = text[:max_chars]
+    try:
+        while get_model().count_tokens(truncated).total_tokens > budget:
+            truncated = truncated[:int(len(truncated) * 0.9)]
+    except Exception:
+        # Offline or API hiccup: the character heuristic is close enough
+        pass
+    return truncated
+
+
+def build_fallback_prefix(pdf_text):
+    """Precompute the static document half of the no-retrieval prompt
+
+    Built once per upload so each question only concatenates its own
+    short suffix instead of rebuilding a document-sized string.
+    """
+    document = truncate_to_token_budget(pdf_text)
+    return ("Based on this PDF text, please answer the question.\n\n"
+            f"Text: {document}\n\nQuestion: ")
+
+
+def get_cache_key(prompt):
+    """Stable cache key for a prompt (builtin hash() is randomized per run)"""
+    return hashlib.blake2b(prompt.encode('utf-8'), digest_size=16).hexdigest()
+
+
+# Exact-match answer cache shared by every session in the process;
+# guarded by a lock since Streamlit runs sessions on separate threads
+_RESPONSE_CACHE = OrderedDict()
+_RESPONSE_CACHE_LOCK = threading.Lock()
+
+
+def _cache_get(cache_key):
+    with _RESPONSE_CACHE_LOCK:
+        if cache_key in _RESPONSE_CACHE:
+            _RESPONSE_CACHE.move_to_end(cache_key)
+            return _RESPONSE_CACHE[cache_key]
+    return None
+
+
+def _cache_put(cache_key, answer):
+    with _RESPONSE_CACHE_LOCK:
+        _RESPONSE_CACHE[cache_key] = answer
+        while len(_RESPONSE_CACHE) > RESPONSE_CACHE_MAX_ENTRIES:
+            _RESPONSE_CACHE.popitem(last=False)
+
+
+def _qa_cache():
+    if 'qa_cache' not in st.session_state:
+        st.session_state.qa_cache = []
+    return st.session_state.qa_cache
+
+
+def clear_response_caches():
+    """Drop the shared exact-match cache and this session's semantic cache"""
+    with _RESPONSE_CACHE_LOCK:
+        _RESPONSE_CACHE.clear()
+    st.session_state.qa_cache = []
+
+
+def check_semantic_cache(question_embedding, pdf_hash):
+    """Return a cached answer for a near-identical question on this PDF"""
+    best_score = 0.0
+    best_answer = None
+    for cached_hash, cached_embedding, answer in _qa_cache():
+        if cached_hash != pdf_hash:
+            continue
+        score = float(np.dot(cached_embedding, question_embedding))
+        if score > best_score:
+            best_score = score
+            best_answer = answer
+    if best_score >= SEMANTIC_CACHE_THRESHOLD:
+        return best_answer
+    return None
+
+
+def store_semantic_cache(question_embedding, pdf_hash, answer):
+    """Remember (pdf, question embedding) -> answer, FIFO-bounded"""
+    qa_cache = _qa_cache()
+    qa_cache.append((pdf_hash, question_embedding, answer))
+    if len(qa_cache) > SEMANTIC_CACHE_MAX_ENTRIES:
+        del qa_cache[:len(qa_cache) - SEMANTIC_CACHE_MAX_ENTRIES]
+
+
+def get_ai_response(prompt, question_embedding=None, pdf_hash=None):
+    """Get response from Gemini AI
+
+    Returns the cached answer as a string on a cache hit, otherwise a
+    generator of text chunks suitable for st.write_stream.
+    """
+    # Check trial limit and API key availability
+    if not _resolve_api_key():
+        raise Exception("❌ Please add your API key to continue.")
+
+    cache_key = get_cache_key(prompt)
+    cached = _cache_get(cache_key)
+    if cached is not None:
+        return cached
+
+    # Disk cache survives restarts; promote hits into the memory layer
+    disk_answer = get_cached_response(cache_key)
+    if disk_answer is not None:
+        _cache_put(cache_key, disk_answer)
+        return disk_answer
+
+    # Exact-match hits are near zero once the prompt embeds document
+    # excerpts, so also match on question similarity for this PDF
+    if question_embedding is not None and pdf_hash is not None:
+        cached_answer = check_semantic_cache(question_embedding, pdf_hash)
+        if cached_answer is not None:
+            return cached_answer
+
+    # Cache hits above don't consume a token; only real API calls do
+    wait_time = acquire_request_token()
+    if wait_time > 0:
+        raise Exception(
+            f"❌ Rate limit reached. Please wait {wait_time:.0f} seconds.")
+
+    return _stream_response(prompt, cache_key, question_embedding, pdf_hash)
+
+
+async def _agenerate(prompt, stream=False):
+    """Issue the generation request, retrying transient rate-limit errors"""
+    for attempt in range(MAX_RETRIES):
+        try:
+            return await get_model().generate_content_async(
+                prompt, stream=stream)
+        except Exception as e:
+            error_message = str(e).lower()
+            _drop_configured_key_on_auth_error(error_message)
+            retryable = _RETRYABLE_ERR_RE.search(error_message) is not None
+            if not retryable or attempt == MAX_RETRIES - 1:
+                raise
+            # Full jitter spreads concurrent sessions' retries over
+            # the backoff window instead of retrying in lockstep
+            await asyncio.sleep(random.uniform(0, 2 ** attempt))
+
+
+def _complete(prompt):
+    """Blocking one-shot completion with the usual retry policy"""
+    loop = asyncio.new_event_loop()
+    try:
+        response = loop.run_until_complete(_agenerate(prompt))
+        return response.text
+    finally:
+        loop.close()
+
+
+# Matches the "A<n>:" markers the batched prompt asks the model to emit
+_BATCH_ANSWER_RE = re.compile(r"^A(\d+)\s*[:.)]\s*", re.MULTILINE)
+
+
+def _split_batched_answers(text, count):
+    """Split a numbered batch reply into one answer per question"""
+    parts = _BATCH_ANSWER_RE.split(text)
+    answers = {}
+    for i in range(1, len(parts) - 1, 2):
+        answers[int(parts[i])] = parts[i + 1].strip()
+    return [answers.get(i + 1) for i in range(count)]
+
+
+def get_batched_ai_response(questions, context, question_embeddings=None,
+                            pdf_hash=None):
+    """Answer several questions with a single Gemini call
+
+    The shared excerpt context is transmitted once instead of once per
+    question. Returns one answer string per question; if the reply can't
+    be split cleanly, every entry is the full reply text.
+    """
+    if not _resolve_api_key():
+        raise Exception("❌ Please add your API key to continue.")
+
+    numbered = "\n".join(
+        f"Q{i + 1}: {question}" for i, question in enumerate(questions))
+    prompt = BATCH_PROMPT_TMPL.format(context=context, questions=numbered)
+
+    cache_key = get_cache_key(prompt)
+    full_text = _cache_get(cache_key)
+    if full_text is None:
+        full_text = get_cached_response(cache_key)
+        if full_text is None:
+            wait_time = acquire_request_token()
+            if wait_time > 0:
+                raise Exception(f"❌ Rate limit reached. "
+                                f"Please wait {wait_time:.0f} seconds.")
+            try:
+                full_text = _complete(prompt)
+            except Exception as e:
+                raise Exception(f"❌ Error: {str(e)}")
+            store_cached_response(cache_key, full_text)
+        _cache_put(cache_key, full_text)
+
+    answers = _split_batched_answers(full_text, len(questions))
+    if any(answer is None for answer in answers):
+        # Model ignored the format; show everything rather than nothing
+        return [full_text] * len(questions)
+
+    if question_embeddings is not None and pdf_hash is not None:
+        for embedding, answer in zip(question_embeddings, answers):
+            store_semantic_cache(embedding, pdf_hash, answer)
+    return answers
+
+
+def _stream_response(prompt, cache_key, question_embedding, pdf_hash):
+    """Yield answer chunks as they arrive, caching the full text at the end"""
+    try:
+        parts = []
+        # st.write_stream needs a sync generator, so pump the async
+        # stream chunk-by-chunk through a private event loop
+        loop = asyncio.new_event_loop()
+        try:
+            response = loop.run_until_complete(_agenerate(prompt, stream=True))
+            chunk_iter = response.__aiter__()
+            while True:
+                try:
+                    chunk = loop.run_until_complete(chunk_iter.__anext__())
+                except StopAsyncIteration:
+                    break
+                if chunk.text:
+                    parts.append(chunk.text)
+                    yield chunk.text
+        finally:
+            loop.close()
+        full_text = "".join(parts)
+
+        _cache_put(cache_key, full_text)
+        store_cached_response(cache_key, full_text)
+        if question_embedding is not None and pdf_hash is not None:
+            store_semantic_cache(question_embedding, pdf_hash, full_text)
+    except Exception as e:
+        raise Exception(f"❌ Error: {str(e)}")
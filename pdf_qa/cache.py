@@ -0,0 +1,59 @@
+"""Persistent on-disk response cache shared across sessions."""
+
+import os
+import time
+import sqlite3
+
+import streamlit as st
+
+CACHE_DIR = ".cache"
+CACHE_DB_PATH = os.path.join(CACHE_DIR, "responses.db")
+
+# Entries older than this are dropped
+CACHE_TTL_S = 7 * 24 * 3600
+
+
+@st.cache_resource
+def _cache_conn():
+    """One WAL-mode SQLite connection per process, shared by all sessions"""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    conn = sqlite3.connect(CACHE_DB_PATH, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS response_cache (
+            cache_key TEXT PRIMARY KEY,
+            answer TEXT NOT NULL,
+            created_at REAL NOT NULL
+        )
+    """)
+    return conn
+
+
+def get_cached_response(cache_key):
+    """Return the stored answer for this key, or None if absent/expired"""
+    conn = _cache_conn()
+    row = conn.execute(
+        "SELECT answer, created_at FROM response_cache WHERE cache_key = ?",
+        (cache_key,)).fetchone()
+    if row is None:
+        return None
+    answer, created_at = row
+    if time.time() - created_at > CACHE_TTL_S:
+        conn.execute("DELETE FROM response_cache WHERE cache_key = ?",
+                     (cache_key,))
+        conn.commit()
+        return None
+    return answer
+
+
+def store_cached_response(cache_key, answer):
+    """Persist an answer and sweep expired entries"""
+    conn = _cache_conn()
+    now = time.time()
+    conn.execute(
+        "INSERT OR REPLACE INTO response_cache VALUES (?, ?, ?)",
+        (cache_key, answer, now))
+    conn.execute("DELETE FROM response_cache WHERE created_at < ?",
+                 (now - CACHE_TTL_S,))
+    conn.commit()
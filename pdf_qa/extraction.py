@@ -0,0 +1,87 @@
+"""PDF text extraction."""
+
+import io
+import os
+import re
+import math
+import functools
+import concurrent.futures
+
+import streamlit as st
+
+# Below this many pages the process-pool overhead outweighs the speedup
+PARALLEL_PAGE_THRESHOLD = 16
+
+# Positional extraction leaves big runs of spaces/newlines that inflate
+# every downstream token count; compiled once at import
+_SPACE_RUN_RE = re.compile(r"[ \t]+")
+_NEWLINE_RUN_RE = re.compile(r"\n{3,}")
+
+
+def _normalize_whitespace(text):
+    """Collapse whitespace runs so prompts and embeddings stay lean"""
+    text = _SPACE_RUN_RE.sub(" ", text)
+    return _NEWLINE_RUN_RE.sub("\n\n", text)
+
+
+@functools.cache
+def _pdfium():
+    """Import pypdfium2 on first use; None when it isn't installed
+
+    Deferring the import keeps the PDFium shared library out of app
+    cold start — nothing needs it until a file is uploaded.
+    """
+    try:
+        import pypdfium2 as pdfium
+    except ImportError:
+        return None
+    return pdfium
+
+
+def _extract_page_range(pdf_bytes, start, stop):
+    """Extract text for pages [start, stop) — runs in a worker process
+
+    PDFium handles aren't picklable, so each worker reopens the document
+    from the raw bytes.
+    """
+    pdf = _pdfium().PdfDocument(pdf_bytes)
+    try:
+        parts = []
+        for i in range(start, stop):
+            textpage = pdf[i].get_textpage()
+            parts.append(textpage.get_text_range())
+            textpage.close()
+        return "\n".join(parts)
+    finally:
+        pdf.close()
+
+
+@st.cache_data(show_spinner=False, ttl=24 * 3600, max_entries=32,
+               persist="disk")
+def extract_text_from_pdf(pdf_bytes: bytes) -> str:
+    """Extract text from PDF, memoized on the file bytes"""
+    pdfium = _pdfium()
+    if pdfium is None:
+        # Fallback: pure-Python pypdf, much slower on big documents
+        import pypdf
+        pdf_reader = pypdf.PdfReader(io.BytesIO(pdf_bytes))
+        parts = [page.extract_text() or "" for page in pdf_reader.pages]
+        return _normalize_whitespace("\n".join(parts))
+
+    pdf = pdfium.PdfDocument(pdf_bytes)
+    num_pages = len(pdf)
+    pdf.close()
+
+    if num_pages < PARALLEL_PAGE_THRESHOLD:
+        return _normalize_whitespace(
+            _extract_page_range(pdf_bytes, 0, num_pages))
+
+    # Beyond ~8 workers, process spawn cost outweighs the extra cores
+    workers = min(8, os.cpu_count() or 1, num_pages)
+    step = math.ceil(num_pages / workers)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_extract_page_range, pdf_bytes,
+                               start, min(start + step, num_pages))
+                   for start in range(0, num_pages, step)]
+        return _normalize_whitespace(
+            "\n".join(future.result() for future in futures))
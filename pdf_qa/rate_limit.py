@@ -0,0 +1,36 @@
+"""Token-bucket rate limiting for Gemini API calls."""
+
+import time
+
+import streamlit as st
+
+# Token bucket: 60 requests/hour sustained, bursts up to 60
+RATE_LIMIT_CAPACITY = 60
+RATE_LIMIT_FILL_TIME_S = 3600.0
+
+
+def acquire_request_token():
+    """Take a token from the rate-limit bucket
+
+    Returns 0.0 when the request may proceed, otherwise the number of
+    seconds until the next token is available. O(1) per check, and
+    bursts are absorbed up to the bucket capacity.
+    """
+    # Monotonic clock: immune to NTP/DST jumps that would otherwise
+    # refill the bucket backwards or inflate wait estimates
+    now = time.monotonic()
+    bucket = st.session_state.get('rate_bucket')
+    if bucket is None:
+        bucket = {'tokens': float(RATE_LIMIT_CAPACITY), 'last_refill': now}
+        st.session_state.rate_bucket = bucket
+
+    refill_rate = RATE_LIMIT_CAPACITY / RATE_LIMIT_FILL_TIME_S
+    bucket['tokens'] = min(float(RATE_LIMIT_CAPACITY),
+                           bucket['tokens']
+                           + (now - bucket['last_refill']) * refill_rate)
+    bucket['last_refill'] = now
+
+    if bucket['tokens'] >= 1.0:
+        bucket['tokens'] -= 1.0
+        return 0.0
+    return (1.0 - bucket['tokens']) / refill_rate
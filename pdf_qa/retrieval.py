@@ -0,0 +1,140 @@
+"""Chunking and embedding-based retrieval over the extracted PDF text."""
+
+import numpy as np
+import streamlit as st
+
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+
+@st.cache_resource
+def get_embedding_model():
+    """Load the sentence-transformer used for chunk retrieval (once per process)"""
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer('all-MiniLM-L6-v2')
+
+
+def chunk_text(text, chunk_size=1200, chunk_overlap=200):
+    """Split text into overlapping chunks, preferring paragraph/sentence breaks"""
+    chunks = []
+    start = 0
+    n = len(text)
+    while start < n:
+        end = min(start + chunk_size, n)
+        if end < n:
+            # Backtrack to the nearest natural break so chunks stay coherent
+            for separator in ("\n\n", "\n", ". ", " "):
+                cut = text.rfind(separator, start + chunk_size // 2, end)
+                if cut != -1:
+                    end = cut + len(separator)
+                    break
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= n:
+            break
+        start = max(end - chunk_overlap, start + 1)
+    return chunks
+
+
+def build_chunk_index(text):
+    """Chunk the document and embed every chunk for similarity retrieval
+
+    All chunks go through a single batched encode so the embedding model
+    dispatches one matmul per batch rather than one per chunk, and the
+    matrix is stored contiguous float32 so retrieval is one
+    cache-friendly GEMV.
+    """
+    chunks = chunk_text(text)
+    model = get_embedding_model()
+    embeddings = model.encode(chunks, batch_size=64,
+                              convert_to_numpy=True,
+                              normalize_embeddings=True,
+                              show_progress_bar=False)
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    codes, scales = _quantize_rows(embeddings)
+    return chunks, {'codes': codes, 'scales': scales}
+
+
+def _quantize_rows(matrix):
+    """Symmetric per-row int8 quantization: codes[i] * scales[i] ~ row i
+
+    Cuts the stored index to a quarter of float32, which matters once
+    sessions pile up — retrieval on the top-k scan is memory-bound, so
+    bandwidth saved is latency saved.
+    """
+    scales = np.abs(matrix).max(axis=1, keepdims=True) / 127.0
+    scales[scales == 0.0] = 1.0
+    codes = np.round(matrix / scales).astype(np.int8)
+    return codes, scales.astype(np.float32).ravel()
+
+
+def embed_query(text):
+    """Embed a single query string, L2-normalized"""
+    model = get_embedding_model()
+    vector = model.encode(text, convert_to_numpy=True,
+                          normalize_embeddings=True,
+                          show_progress_bar=False)
+    return np.ascontiguousarray(vector, dtype=np.float32)
+
+
+if njit is not None:
+    _TOPK_BLOCKS = 8
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _fused_topk(codes, scales, q_codes, q_scale, k):
+        """Score rows and keep the k best in one pass
+
+        Each block of rows maintains its own running top-k while the dot
+        products are computed, so no full score array is materialized;
+        the per-block winners are merged at the end.
+        """
+        n, d = codes.shape
+        block = (n + _TOPK_BLOCKS - 1) // _TOPK_BLOCKS
+        best_idx = np.full((_TOPK_BLOCKS, k), -1, np.int64)
+        best_score = np.full((_TOPK_BLOCKS, k), -np.inf, np.float32)
+        for b in prange(_TOPK_BLOCKS):
+            hi = min(b * block + block, n)
+            for i in range(b * block, hi):
+                acc = np.int32(0)
+                for j in range(d):
+                    acc += np.int32(codes[i, j]) * q_codes[j]
+                score = np.float32(acc) * scales[i] * q_scale
+                worst = 0
+                for t in range(1, k):
+                    if best_score[b, t] < best_score[b, worst]:
+                        worst = t
+                if score > best_score[b, worst]:
+                    best_score[b, worst] = score
+                    best_idx[b, worst] = i
+        flat_score = best_score.ravel()
+        flat_idx = best_idx.ravel()
+        out = np.empty(k, np.int64)
+        found = 0
+        for t in np.argsort(-flat_score):
+            if flat_idx[t] >= 0 and found < k:
+                out[found] = flat_idx[t]
+                found += 1
+        return out[:found]
+
+
+def retrieve_chunks(query_vector, chunks, index, top_k=8):
+    """Return the chunks most similar to the query vector, best match first"""
+    q_scale = float(np.abs(query_vector).max()) / 127.0
+    if q_scale == 0.0:
+        q_scale = 1.0
+    q_codes = np.round(query_vector / q_scale).astype(np.int32)
+
+    k = min(top_k, len(chunks))
+    if njit is not None:
+        top = _fused_topk(index['codes'], index['scales'], q_codes,
+                          np.float32(q_scale), k)
+    else:
+        # int32 accumulation: 384 dims of +-127*127 overflows int16
+        scores = (index['codes'].astype(np.int32) @ q_codes).astype(np.float32)
+        scores *= index['scales'] * q_scale
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+    return [chunks[i] for i in top]
@@ -0,0 +1,86 @@
+"""Server-side storage for free-trial usage."""
+
+import os
+import sqlite3
+
+import streamlit as st
+
+# Free questions before a user must bring their own API key
+TRIAL_LIMIT = 5
+
+DATA_DIR = ".cache"
+DB_PATH = os.path.join(DATA_DIR, "trials.db")
+
+
+def init_database():
+    """Create the usage table if it doesn't exist yet"""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS user_usage (
+                user_id TEXT PRIMARY KEY,
+                request_count INTEGER NOT NULL DEFAULT 0,
+                first_request TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+@st.cache_resource
+def ensure_db():
+    """Create the schema once per process
+
+    app.py's top level re-executes on every rerun, so the caller can't
+    just invoke init_database() directly without paying a connect +
+    CREATE TABLE round-trip per interaction.
+    """
+    init_database()
+    return True
+
+
+@st.cache_resource
+def get_db_connection():
+    """One trial-store connection per process, shared across sessions
+
+    WAL mode keeps readers and the increment writer from blocking each
+    other; NORMAL sync is plenty for a trial counter.
+    """
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def check_trial_usage(user_id):
+    """Return how many free requests this client has used"""
+    conn = get_db_connection()
+    row = conn.execute(
+        "SELECT request_count FROM user_usage WHERE user_id = ?",
+        (user_id,)).fetchone()
+    return row[0] if row else 0
+
+
+def increment_trial_usage(user_id):
+    """Claim one free request and return the new total
+
+    A single UPSERT both bumps and reads the count, so the hot question
+    path touches the database once instead of SELECT-then-INSERT.
+    """
+    conn = get_db_connection()
+    row = conn.execute("""
+        INSERT INTO user_usage (user_id, request_count)
+        VALUES (?, 1)
+        ON CONFLICT(user_id)
+        DO UPDATE SET request_count = request_count + 1
+        RETURNING request_count
+    """, (user_id,)).fetchone()
+    conn.commit()
+    return row[0]
+
+
+def get_remaining_trial_requests(user_id):
+    """Free requests this client has left"""
+    return max(0, TRIAL_LIMIT - check_trial_usage(user_id))